@@ -13,11 +13,53 @@ from plenoptic.synthesize.synthesis import OptimizedSynthesis
 from plenoptic.tools.data import to_numpy
 from plenoptic.tools.optim import penalize_range
 from plenoptic.tools.validate import validate_input, validate_model
-from plenoptic.tools.convergence import pixel_change_convergence
 from .straightness import (deviation_from_line, make_straight_line,
                            sample_brownian_bridge)
 
 
+@torch.jit.script
+def _step_norms(new_geodesic: Tensor, last_geodesic: Tensor,
+                grad: Tensor) -> Tuple[Tensor, Tensor]:
+    """Compute the gradient norm and pixel change norm of an optimizer step.
+
+    Scripted so that both norms (and the difference between the geodesics)
+    are computed together, rather than as separately dispatched ops.
+
+    """
+    grad_norm = torch.linalg.vector_norm(grad, ord=2)
+    pixel_change_norm = torch.linalg.vector_norm(new_geodesic - last_geodesic,
+                                                 ord=2)
+    return grad_norm, pixel_change_norm
+
+
+@torch.jit.script
+def _squared_step_norms(z: Tensor) -> Tensor:
+    """Compute the squared L2 norm of each step in `z`, over height and width.
+
+    Scripted so the difference between consecutive frames and the squared-norm
+    reduction are computed together, without materializing ``torch.diff``.
+
+    """
+    velocity = z[1:] - z[:-1]
+    return (velocity * velocity).sum(dim=[2, 3])
+
+
+def _frames_equal(frame_a: Tensor, frame_b: Tensor) -> bool:
+    """Check whether two frames are equal.
+
+    If both frames are views of the same memory (e.g., the user built
+    ``initial_sequence`` around the anchor points themselves), we can skip the
+    element-wise comparison (and the device sync it requires).
+
+    """
+    if (frame_a.device == frame_b.device and frame_a.dtype == frame_b.dtype
+            and frame_a.shape == frame_b.shape
+            and frame_a.stride() == frame_b.stride()
+            and frame_a.data_ptr() == frame_b.data_ptr()):
+        return True
+    return torch.equal(frame_a, frame_b)
+
+
 class Geodesic(OptimizedSynthesis):
     r"""Synthesize an approximate geodesic between two images according to a model.
 
@@ -45,6 +87,16 @@ class Geodesic(OptimizedSynthesis):
     allowed_range
         Range (inclusive) of allowed pixel values. Any values outside this
         range will be penalized.
+    use_amp
+        Whether to run the model under ``torch.autocast`` during synthesis,
+        which can substantially speed up the forward pass of convolutional
+        and linear layers on recent GPUs. The model's output is cast back to
+        the geodesic's dtype, but it only has the precision of ``amp_dtype``,
+        so the step energy (which is computed from the differences between
+        neighboring frames' representations) is less accurate than without
+        autocast. Only use this if your model is autocast-safe.
+    amp_dtype
+        The lower-precision dtype to use if ``use_amp`` is True.
 
     Attributes
     ----------
@@ -98,7 +150,9 @@ class Geodesic(OptimizedSynthesis):
                  model: torch.nn.Module, n_steps: int = 10,
                  initial_sequence: Optional[Tensor] = None,
                  range_penalty_lambda: float = .1,
-                 allowed_range: Tuple[float, float] = (0, 1)):
+                 allowed_range: Tuple[float, float] = (0, 1),
+                 use_amp: bool = False,
+                 amp_dtype: torch.dtype = torch.bfloat16):
         super().__init__(range_penalty_lambda, allowed_range)
         validate_input(image_a, no_batch=True, allowed_range=allowed_range)
         validate_input(image_b, no_batch=True, allowed_range=allowed_range)
@@ -107,10 +161,17 @@ class Geodesic(OptimizedSynthesis):
 
         self.n_steps = n_steps
         self._model = model
+        self._use_amp = use_amp
+        self._amp_dtype = amp_dtype
         self._image_a = image_a
         self._image_b = image_b
         self.pixelfade = make_straight_line(image_a, image_b, n_steps)
+        # used for the default stop_criterion in synthesize
+        self._pixelfade_norm = torch.linalg.vector_norm(self.pixelfade, ord=2).item()
         self._initialize(initial_sequence, image_a, image_b, n_steps)
+        # these are lists (stacked by the corresponding properties) rather than
+        # preallocated tensors: appending is cheap, and lists can grow when
+        # synthesis is resumed with a different max_iter or store_progress
         self._dev_from_line = []
         self._step_energy = []
 
@@ -131,7 +192,9 @@ class Geodesic(OptimizedSynthesis):
 
         """
         if initial_sequence is None:
-            geodesic = make_straight_line(start, stop, n_steps)
+            # self.pixelfade is exactly this straight line, so copy it rather
+            # than computing it again
+            geodesic = self.pixelfade.clone()
         else:
             if initial_sequence.ndimension() < 4 or initial_sequence.shape[0] != n_steps+1:
                 raise ValueError("initial_sequence must be torch.Size([n_steps+1"
@@ -142,15 +205,18 @@ class Geodesic(OptimizedSynthesis):
                                  " number of channels, height and width, but got"
                                  f"initial_sequence: {initial_sequence.size()}, "
                                  f"image_a: {start.size()}, image_b: {stop.size()}.")
-            if not torch.equal(initial_sequence[0], start[0]):
+            if not _frames_equal(initial_sequence[0], start[0]):
                 raise ValueError("First frame of initial_sequence must be the same as image_a!")
-            if not torch.equal(initial_sequence[-1], stop[0]):
+            if not _frames_equal(initial_sequence[-1], stop[0]):
                 raise ValueError("Last frame of initial_sequence must be the same as image_b!")
             geodesic = initial_sequence.clone().detach()
             geodesic = geodesic.to(dtype=start.dtype, device=start.device)
         _, geodesic, _ = torch.split(geodesic, [1, n_steps-1, 1])
         geodesic.requires_grad_()
         self._geodesic = geodesic
+        # buffer holding the previous iteration's geodesic, reused across
+        # optimizer steps so we don't allocate a new clone every iteration
+        self._last_geodesic = torch.empty_like(geodesic, requires_grad=False)
 
     def synthesize(self, max_iter: int = 1000,
                    optimizer: Optional[torch.optim.Optimizer] = None,
@@ -166,9 +232,10 @@ class Geodesic(OptimizedSynthesis):
             (unless we hit the stop criterion).
         optimizer
             The optimizer to use. If None and this is the first time calling
-            synthesize, we use Adam(lr=.001, amsgrad=True); if synthesize has
-            been called before, this must be None and we reuse the previous
-            optimizer.
+            synthesize, we use Adam(lr=.001, amsgrad=True) (with
+            ``fused=True`` if the geodesic is on a cuda device); if synthesize
+            has been called before, this must be None and we reuse the
+            previous optimizer.
         store_progress
             Whether we should store the step energy and deviation of the
             representation from a straight line. If False, we don't save
@@ -188,10 +255,15 @@ class Geodesic(OptimizedSynthesis):
         """
         if stop_criterion is None:
             # semi arbitrary default choice of tolerance
-            stop_criterion = torch.linalg.vector_norm(self.pixelfade, ord=2) / 1e4 * (1 + 5 ** .5) / 2
-            stop_criterion = stop_criterion.item()
+            stop_criterion = self._pixelfade_norm / 1e4 * (1 + 5 ** .5) / 2
         print(f"\n Stop criterion for pixel_change_norm = {stop_criterion:.5e}")
 
+        if optimizer is None and self.optimizer is None:
+            # on cuda, use the fused implementation of Adam, which performs
+            # the whole update in a single kernel
+            fused = {'fused': True} if self._geodesic.device.type == 'cuda' else {}
+            optimizer = torch.optim.Adam([self._geodesic], lr=.001,
+                                         amsgrad=True, **fused)
         self._initialize_optimizer(optimizer, '_geodesic', .001)
 
         # get ready to store progress
@@ -199,9 +271,11 @@ class Geodesic(OptimizedSynthesis):
 
         pbar = tqdm(range(max_iter))
         for _ in pbar:
-            self._store(len(self.losses))
-
             loss = self._optimizer_step(pbar)
+            # the closure evaluated the objective on the geodesic from before
+            # this step, so the cached representation and step energy
+            # correspond to iteration len(self._losses)-1
+            self._store(len(self._losses) - 1)
 
             if not torch.isfinite(loss):
                 raise ValueError("Found a NaN in loss during optimization.")
@@ -238,20 +312,55 @@ class Geodesic(OptimizedSynthesis):
         loss
 
         """
+        # release the previous representation before computing the new one,
+        # so both aren't held in memory at the same time
+        self._geodesic_representation = None
         if geodesic is None:
             geodesic = self.geodesic
-        self._geodesic_representation = self.model(geodesic)
-        self._most_recent_step_energy = self._calculate_step_energy(self._geodesic_representation)
+        self._geodesic_representation = self._run_model(geodesic)
+        return self._penalized_path_energy(self._geodesic_representation)
+
+    def _penalized_path_energy(self, representation: Tensor) -> Tensor:
+        """Compute the loss from the representation of a geodesic.
+
+        Also caches ``self._most_recent_step_energy``.
+
+        """
+        self._most_recent_step_energy = self._calculate_step_energy(representation)
         loss = self._most_recent_step_energy.sum()
-        range_penalty = penalize_range(self.geodesic, self.allowed_range)
+        # the anchor points are validated to lie within allowed_range, so they
+        # never contribute to the penalty and we only need the frames between
+        range_penalty = penalize_range(self._geodesic, self.allowed_range)
         return loss + self.range_penalty_lambda * range_penalty
 
+    def _run_model(self, x: Tensor) -> Tensor:
+        """Run the model on `x`, under autocast if ``use_amp`` was set.
+
+        Under autocast, the output is cast back to the dtype of `x`, so that
+        it can be combined with tensors of that dtype. This does not recover
+        the precision lost by running the model in ``amp_dtype``.
+
+        """
+        if not self._use_amp:
+            return self.model(x)
+        with torch.autocast(x.device.type, dtype=self._amp_dtype):
+            rep = self.model(x)
+        return rep.to(x.dtype)
+
+    def _pixelfade_check(self) -> Tensor:
+        """Compute the loss on ``self.pixelfade``, used to check the model on load.
+
+        We run the model directly (rather than through ``_run_model``), so
+        that this never uses autocast and does not depend on ``use_amp``,
+        which may differ between the saved and loading objects.
+
+        """
+        return self._penalized_path_energy(self.model(self.pixelfade))
+
     def _calculate_step_energy(self, z):
         """calculate the energy (i.e. squared l2 norm) of each step in `z`.
         """
-        velocity = torch.diff(z, dim=0)
-        step_energy = torch.linalg.vector_norm(velocity, ord=2, dim=[2, 3]) ** 2
-        return step_energy
+        return _squared_step_norms(z)
 
     def _optimizer_step(self, pbar):
         """
@@ -267,16 +376,14 @@ class Geodesic(OptimizedSynthesis):
         - store some information
         - return pixel_change_norm, the norm of the step just taken
         """
-        last_iter_geodesic = self._geodesic.clone()
+        self._last_geodesic.copy_(self._geodesic.detach())
         loss = self.optimizer.step(self._closure)
         self._losses.append(loss.item())
 
-        grad_norm = torch.linalg.vector_norm(self._geodesic.grad.data,
-                                             ord=2, dim=None)
+        grad_norm, pixel_change_norm = _step_norms(self._geodesic.detach(),
+                                                   self._last_geodesic,
+                                                   self._geodesic.grad.data)
         self._gradient_norm.append(grad_norm)
-
-        pixel_change_norm = torch.linalg.vector_norm(self._geodesic - last_iter_geodesic,
-                                                     ord=2, dim=None)
         self._pixel_change_norm.append(pixel_change_norm)
         # displaying some information
         pbar.set_postfix(OrderedDict([('loss', f'{loss.item():.4e}'),
@@ -314,7 +421,16 @@ class Geodesic(OptimizedSynthesis):
             Whether the pixel change norm has stabilized or not.
 
         """
-        return pixel_change_convergence(self, stop_criterion, stop_iters_to_check)
+        # equivalent to plenoptic's pixel_change_convergence, but only looks at
+        # the last stop_iters_to_check entries (rather than converting the
+        # whole history with the pixel_change_norm property) and does a single
+        # comparison on device. entries may be on different devices if to()
+        # was called between calls to synthesize
+        if len(self._pixel_change_norm) > stop_iters_to_check:
+            recent = torch.stack([p.to(self._geodesic.device) for p in
+                                  self._pixel_change_norm[-stop_iters_to_check:]])
+            return bool((recent < stop_criterion).all())
+        return False
 
     def calculate_jerkiness(self, geodesic: Optional[Tensor] = None) -> Tensor:
         """Compute the alignment of representation's acceleration to model local curvature.
@@ -336,17 +452,27 @@ class Geodesic(OptimizedSynthesis):
         if geodesic is None:
             geodesic = self.geodesic
         geodesic_representation = self.model(geodesic)
-        velocity = torch.diff(geodesic_representation, dim=0)
-        acceleration = torch.diff(velocity, dim=0)
+        # second finite difference, computed directly rather than by taking
+        # torch.diff twice (which materializes the velocity)
+        acceleration = (geodesic_representation[2:] - 2 * geodesic_representation[1:-1]
+                        + geodesic_representation[:-2])
         acc_magnitude = torch.linalg.vector_norm(acceleration, ord=2, dim=[1,2,3],
                                                  keepdim=True)
         acc_direction = torch.div(acceleration, acc_magnitude)
         # we slice the output of the VJP, rather than slicing geodesic, because
         # slicing interferes with the gradient computation:
         # https://stackoverflow.com/a/54767100
+        # this computes all frames' products in a single backward pass. this
+        # assumes the model processes each frame independently, so that frame
+        # t of the output only depends on acc_direction[t]. models that mix
+        # information across frames (e.g., by unwrapping phase along the batch
+        # dimension) violate this assumption, and for them each frame's output
+        # also includes contributions from the other frames' directions. we
+        # don't pass per-frame directions with is_grads_batched=True, which
+        # would avoid this but run one backward pass per frame.
         accJac = self._vector_jacobian_product(geodesic_representation[1:-1],
                                                geodesic, acc_direction)[1:-1]
-        step_jerkiness = torch.linalg.vector_norm(accJac, dim=[1,2,3], ord=2) ** 2
+        step_jerkiness = (accJac * accJac).sum(dim=[1, 2, 3])
         return step_jerkiness
 
     def _vector_jacobian_product(self, y, x, a):
@@ -363,7 +489,9 @@ class Geodesic(OptimizedSynthesis):
         """Store step_energy and dev_from_line, if appropriate.
 
         if it's the right iteration, we update ``step_energy`` and
-        ``dev_from_line``.
+        ``dev_from_line``, using the values cached by the most recent call to
+        ``objective_function`` (so this must be called after the optimizer
+        has been stepped). The cached representation is released afterwards.
 
         Parameters
         ----------
@@ -377,20 +505,18 @@ class Geodesic(OptimizedSynthesis):
 
         """
         if self.store_progress and (i % self.store_progress == 0):
-            # want these to always be on cpu, to reduce memory use for GPUs
-            try:
-                self._step_energy.append(self._most_recent_step_energy.detach().to('cpu'))
-                self._dev_from_line.append(torch.stack(deviation_from_line(self._geodesic_representation.detach().to('cpu'))).T)
-            except AttributeError:
-                # the first time _store is called (i.e., before optimizer is
-                # stepped for first time) those attributes won't be
-                # initialized
-                geod_rep = self.model(self.geodesic)
-                self._step_energy.append(self._calculate_step_energy(geod_rep).detach().to('cpu'))
-                self._dev_from_line.append(torch.stack(deviation_from_line(geod_rep.detach().to('cpu'))).T)
+            # want these to always be on cpu, to reduce memory use for GPUs.
+            # we compute the deviation on the representation's device, so only
+            # the small (n_steps+1, 2) result needs to be transferred
+            dev_from_line = torch.stack(deviation_from_line(self._geodesic_representation.detach()), dim=1)
+            self._step_energy.append(self._most_recent_step_energy.detach().to('cpu'))
+            self._dev_from_line.append(dev_from_line.to('cpu'))
             stored = True
         else:
             stored = False
+        # we no longer need the (potentially large) representation, so free it
+        # rather than holding onto it through the next optimizer step
+        self._geodesic_representation = None
         return stored
 
     def save(self, file_path: str):
@@ -407,8 +533,14 @@ class Geodesic(OptimizedSynthesis):
         # I don't think any of our existing attributes can be used to check
         # whether model has changed (unlike Metamer, which stores
         # target_representation), so we use the following as a proxy
-        self._save_check = self.objective_function(self.pixelfade)
-        super().save(file_path, attrs=None)
+        self._save_check = self._pixelfade_check()
+        # _last_geodesic is just a buffer used during optimization, so don't
+        # save it (it gets re-created on load). whether to use amp is a
+        # property of how this object runs, not of the synthesis, so we don't
+        # want it to overwrite the loading object's settings
+        attrs = [k for k in vars(self)
+                 if k not in ['_last_geodesic', '_use_amp', '_amp_dtype']]
+        super().save(file_path, attrs=attrs)
 
     def to(self, *args, **kwargs):
         r"""Moves and/or casts the parameters and buffers.
@@ -444,9 +576,10 @@ class Geodesic(OptimizedSynthesis):
                 dtype and device for all parameters and buffers in this module
 
         """
-        attrs = ['_image_a', '_image_b', '_geodesic', '_model',
+        attrs = ['_image_a', '_image_b', '_geodesic', '_last_geodesic', '_model',
                  '_step_energy', '_dev_from_line', 'pixelfade']
         super().to(*args, attrs=attrs, **kwargs)
+        self._pixelfade_norm = torch.linalg.vector_norm(self.pixelfade, ord=2).item()
 
     def load(self, file_path: str,
              map_location: Union[str, None] = None,
@@ -490,7 +623,7 @@ class Geodesic(OptimizedSynthesis):
                             '_range_penalty_lambda',
                             '_allowed_range', 'pixelfade']
         check_loss_functions = []
-        new_loss = self.objective_function(self.pixelfade)
+        new_loss = self._pixelfade_check()
         super().load(file_path, map_location=map_location,
                      check_attributes=check_attributes,
                      check_loss_functions=check_loss_functions,
@@ -501,6 +634,9 @@ class Geodesic(OptimizedSynthesis):
                              f" Self: {new_loss}, Saved: {old_loss}")
         # make this require a grad again
         self._geodesic.requires_grad_()
+        # this isn't saved, so re-create it to match the loaded geodesic
+        self._last_geodesic = torch.empty_like(self._geodesic,
+                                               requires_grad=False)
         # these are always supposed to be on cpu, but may get copied over to
         # gpu on load (which can cause problems when resuming synthesis), so
         # fix that.
@@ -580,6 +716,7 @@ def plot_loss(geodesic: Geodesic,
            ylabel='Loss')
     return ax
 
+@torch.no_grad()
 def plot_deviation_from_line(geodesic: Geodesic,
                              natural_video: Union[Tensor, None] = None,
                              ax: Union[mpl.axes.Axes, None] = None
@@ -643,6 +780,7 @@ def plot_deviation_from_line(geodesic: Geodesic,
     return ax
 
 
+@torch.no_grad()
 def plot_PC_projections(geodesic: Geodesic,
                         natural_video: Union[Tensor, None] = None,
                         concatenated: bool = False,
@@ -667,6 +805,10 @@ def plot_PC_projections(geodesic: Geodesic,
         Figure containing the plot
 
     """
+    # all the matrices we take the SVD of have one row per frame, so the thin
+    # SVD below is already only O(n_frames**2 * n_pixels). we use it rather
+    # than torch.pca_lowrank because we print the full spectrum of singular
+    # values, and a randomized rank-2 approximation would get that wrong.
     fig, axes = plt.subplots(1, 2, figsize=figsize)
     pixelfade = geodesic.pixelfade.view(geodesic.n_steps+1, -1)
     geo = geodesic.geodesic.view(geodesic.n_steps+1, -1).detach()
@@ -680,15 +822,17 @@ def plot_PC_projections(geodesic: Geodesic,
             natural_video = natural_video - pxf_mean
         _, s, V = torch.linalg.svd(pixelfade, full_matrices=False)
     else:
-        X = torch.cat([geo, pixelfade], dim=0)
-        X_mean = X.mean(0)
+        sequences = [geo, pixelfade]
         if natural_video is not None:
-            X = torch.cat([X, natural_video.view(geodesic.n_steps+1, -1)], dim=0)
-            X_mean = X.mean(0)
-            natural_video = natural_video - X_mean
+            natural_video = natural_video.view(geodesic.n_steps+1, -1)
+            sequences.append(natural_video)
+        X = torch.cat(sequences, dim=0)
+        X_mean = X.mean(0)
         X = X - X_mean
         pixelfade = pixelfade - X_mean
         geo = geo - X_mean
+        if natural_video is not None:
+            natural_video = natural_video - X_mean
         _, s, V = torch.linalg.svd(X, full_matrices=False)
 
     print(s/s.sum())
@@ -708,15 +852,16 @@ def plot_PC_projections(geodesic: Geodesic,
             natural_video_response = natural_video_response - geo_mean
         _, s, V = torch.linalg.svd(geo, full_matrices=False)
     else:
-        X = torch.cat([geo, pixelfade], dim=0)
-        X_mean = X.mean(0)
+        sequences = [geo, pixelfade]
         if natural_video is not None:
-            X = torch.cat([X, natural_video_response.view(geodesic.n_steps+1, -1)], dim=0)
-            X_mean = X.mean(0)
-            natural_video_response = natural_video_response - X_mean
+            sequences.append(natural_video_response)
+        X = torch.cat(sequences, dim=0)
+        X_mean = X.mean(0)
         X = X - X_mean
         pixelfade = pixelfade - X_mean
         geo = geo - X_mean
+        if natural_video is not None:
+            natural_video_response = natural_video_response - X_mean
         _, s, V = torch.linalg.svd(X, full_matrices=False)
 
     print(s/s.sum())
@@ -34,8 +34,8 @@ def make_straight_line(start: Tensor, stop: Tensor, n_steps: int) -> Tensor:
     device = start.device
     start = start.reshape(1, -1)
     stop = stop.reshape(1, -1)
-    tt = torch.linspace(0, 1, steps=n_steps+1, device=device
-                        ).view(n_steps+1, 1)
+    tt = torch.linspace(0, 1, steps=n_steps+1, device=device,
+                        dtype=start.dtype).view(n_steps+1, 1)
     straight = (1 - tt) * start + tt * stop
 
     return straight.reshape((n_steps+1, *shape))
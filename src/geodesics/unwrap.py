@@ -26,22 +26,32 @@ def unwrap(p: Tensor, dim: int = -1) -> Tensor:
         Unwrapped tensor, same shape as `p`
 
     """
-    # goal is to add a single 0 at the beginning of whichever dimension we're
-    # unwrapping along, see
-    # https://pytorch.org/docs/stable/generated/torch.nn.functional.pad.html
-    # for why pad is constructed this way
-    pad = p.ndim * [0, 0]
     if dim >= p.ndim or dim < -p.ndim:
         raise ValueError("dim must lie within [-p.ndim, p.ndim-1], but got "
                          f"dim={dim} and p.ndim={p.ndim} instead!")
-    elif dim >= 0:
-        idx = 2 * (p.ndim - dim - 1)
-    else:
-        idx = 2 * abs(dim + 1)
-    pad[idx] = 1
-    dp = torch.nn.functional.pad(p.diff(dim=dim), pad)
+    # the first element along dim never gets corrected, so we only compute
+    # corrections for the remaining ones (rather than padding the difference
+    # with a zero at the beginning)
+    n = p.shape[dim]
+    dp = p.diff(dim=dim)
+    # use torch.where rather than in-place masked assignment, so that these
+    # are all purely elementwise ops (which can be fused)
     dp_m = ((dp+np.pi) % (2 * np.pi)) - np.pi
-    dp_m[(dp_m == -np.pi) & (dp > 0)] = np.pi
-    p_adj = dp_m - dp
-    p_adj[dp.abs() < np.pi] = 0
-    return p + p_adj.cumsum(dim)
+    dp_m = torch.where((dp_m == -np.pi) & (dp > 0), dp_m.new_tensor(np.pi), dp_m)
+    # dp - dp_m is a multiple of the period, so we store the correction as an
+    # integer number of periods. accumulating these integers is exact, whereas
+    # accumulating the floating point corrections drifts with the length of p.
+    # casting a non-finite value to an integer is undefined, so we zero those
+    # out first
+    finite = torch.isfinite(dp)
+    n_periods = torch.round((dp - dp_m) / (2 * np.pi))
+    n_periods = torch.where(finite & (dp.abs() >= np.pi), n_periods,
+                            n_periods.new_tensor(0)).to(torch.int64)
+    corrections = (2 * np.pi) * n_periods.cumsum(dim).to(p.dtype)
+    # like numpy, a non-finite difference makes everything after it NaN
+    after_nonfinite = (~finite).cumsum(dim) > 0
+    corrections = torch.where(after_nonfinite,
+                              corrections.new_tensor(float('nan')), corrections)
+    unwrapped = p.clone()
+    unwrapped.narrow(dim, 1, n - 1).sub_(corrections)
+    return unwrapped
@@ -1,3 +1,4 @@
+import functools
 import pytest
 import plenoptic as po
 import torch
@@ -5,10 +6,14 @@ import torch
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 DTYPE = torch.float32
 
-torch.set_num_threads(1)  # torch uses all avail threads which will slow tests
-torch.manual_seed(0)
-if torch.cuda.is_available():
-    torch.cuda.manual_seed(0)
+
+def pytest_configure(config):
+    torch.set_num_threads(1)  # torch uses all avail threads which will slow tests
+    torch.manual_seed(0)
+    if torch.cuda.is_available():
+        torch.cuda.manual_seed(0)
+
+
 class ColorModel(torch.nn.Module):
     """Simple model that takes color image as input and outputs 2d conv."""
     def __init__(self):
@@ -19,32 +24,35 @@ class ColorModel(torch.nn.Module):
         return self.conv(x)
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def curie_img():
     return po.data.curie().to(DEVICE)
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def einstein_img():
     return po.data.einstein().to(DEVICE)
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def einstein_small_seq(einstein_img_small):
     return po.tools.translation_sequence(einstein_img_small, 5)
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def einstein_img_small(einstein_img):
-    return po.tools.center_crop(einstein_img, 64).to(DEVICE)
+    return po.tools.center_crop(einstein_img, 64)
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def color_img():
     img = po.data.color_wheel().to(DEVICE)
     return img[..., :256, :256]
 
 
+# the tests never change the models' parameters, so we build each model once
+# and share it
+@functools.lru_cache(maxsize=None)
 def get_model(name):
     if name == 'Identity':
         return po.simul.models.naive.Identity().to(DEVICE)
@@ -59,6 +67,6 @@ def get_model(name):
         return mdl
 
 
-@pytest.fixture(scope='package')
+@pytest.fixture(scope='session')
 def model(request):
     return get_model(request.param)
@@ -102,8 +102,8 @@ class TestSequences(object):
         if multichannel:
             einstein_img = einstein_img.repeat(1, 3, 1, 1)
         with expectation:
-            shifted = geo.translation_sequence(einstein_img, n_steps)
-            assert torch.equal(shifted[0], einstein_img[0]), "somehow first frame changed!"
+            shifted = geo.translation_sequence(einstein_img, n_steps).cpu()
+            assert torch.equal(shifted[0], einstein_img[0].cpu()), "somehow first frame changed!"
             assert torch.equal(shifted[1, 0, :, 1], shifted[0, 0, :, 0]), "wrong dimension was translated!"
 
     @pytest.mark.parametrize("func", ['make_straight_line', 'translation_sequence',
@@ -119,8 +119,22 @@ class TestSequences(object):
         # return a 4d tensor. regardless seq[0] will be a tensor
         assert seq[0].device == einstein_img.device, f'{func} changed device!'
 
+@pytest.fixture(scope='module')
+def saved_geodesic(einstein_small_seq, model, tmp_path_factory):
+    # synthesizing and saving is the expensive part of test_save_load, so we
+    # only do it once (per model) and share it across its parametrizations
+    moog = geo.Geodesic(einstein_small_seq[:1], einstein_small_seq[-1:], model,
+                        3, range_penalty_lambda=0)
+    moog.synthesize(max_iter=4)
+    save_path = op.join(tmp_path_factory.mktemp('save_load'),
+                        'test_geodesic_save_load.pt')
+    moog.save(save_path)
+    return moog, save_path
+
+
 class TestGeodesic(object):
 
+    @pytest.mark.slow
     @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
     @pytest.mark.parametrize("optimizer", [None, "SGD"])
     @pytest.mark.parametrize("n_steps", [5, 10])
@@ -140,21 +154,24 @@ class TestGeodesic(object):
         moog = geo.Geodesic(einstein_small_seq[:1], einstein_small_seq[-1:],
                             model, 5)
         moog.synthesize(max_iter=5)
-        assert torch.equal(moog.geodesic[0], einstein_small_seq[0]), "Somehow first endpoint changed!"
-        assert torch.equal(moog.geodesic[-1], einstein_small_seq[-1]), "Somehow last endpoint changed!"
-        assert not torch.equal(moog.pixelfade[1:-1], moog.geodesic[1:-1]), "Somehow middle of geodesic didn't changed!"
+        # move everything to cpu at once, rather than syncing for each comparison
+        geodesic = moog.geodesic.detach().cpu()
+        pixelfade = moog.pixelfade.cpu()
+        seq = einstein_small_seq.cpu()
+        assert torch.equal(geodesic[0], seq[0]), "Somehow first endpoint changed!"
+        assert torch.equal(geodesic[-1], seq[-1]), "Somehow last endpoint changed!"
+        assert not torch.equal(pixelfade[1:-1], geodesic[1:-1]), "Somehow middle of geodesic didn't changed!"
 
     @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
     @pytest.mark.parametrize('fail', [False, 'img_a', 'img_b', 'model', 'n_steps',
                                       'range_penalty'])
-    def test_save_load(self, einstein_small_seq, model, fail, tmp_path):
+    def test_save_load(self, einstein_small_seq, model, fail, saved_geodesic):
+        moog, save_path = saved_geodesic
         img_a = einstein_small_seq[:1]
         img_b = einstein_small_seq[-1:]
+        # must match the values used in saved_geodesic
         n_steps = 3
         range_penalty = 0
-        moog = geo.Geodesic(img_a, img_b, model, n_steps, range_penalty_lambda=range_penalty)
-        moog.synthesize(max_iter=4)
-        moog.save(op.join(tmp_path, 'test_geodesic_save_load.pt'))
         if fail:
             if fail == 'img_a':
                 img_a = torch.rand_like(img_a)
@@ -175,13 +192,11 @@ class TestGeodesic(object):
             moog_copy = geo.Geodesic(img_a, img_b, model, n_steps,
                                      range_penalty_lambda=range_penalty)
             with expectation:
-                moog_copy.load(op.join(tmp_path, "test_geodesic_save_load.pt"),
-                               map_location=DEVICE)
+                moog_copy.load(save_path, map_location=DEVICE)
         else:
             moog_copy = geo.Geodesic(img_a, img_b, model, n_steps,
                                      range_penalty_lambda=range_penalty)
-            moog_copy.load(op.join(tmp_path, "test_geodesic_save_load.pt"),
-                           map_location=DEVICE)
+            moog_copy.load(save_path, map_location=DEVICE)
             for k in ['image_a', 'image_b', 'pixelfade', 'geodesic']:
                 if not getattr(moog, k).allclose(getattr(moog_copy, k), rtol=1e-2):
                     raise ValueError(f"Something went wrong with saving and loading! {k} not the same")
@@ -234,6 +249,7 @@ class TestGeodesic(object):
 
     # this determines whether we mix across channels or treat them separately,
     # both of which are supported
+    @pytest.mark.slow
     @pytest.mark.parametrize('model', ['ColorModel', 'Identity'], indirect=True)
     def test_multichannel(self, color_img, model):
         img = color_img[..., :64, :64]
@@ -243,6 +259,37 @@ class TestGeodesic(object):
         moog.synthesize(max_iter=5)
         assert moog.geodesic.shape[1:] == img.shape[1:], "Geodesic image should have same number of channels, height, width shape as input!"
 
+    @pytest.mark.parametrize('model', ['ColorModel'], indirect=True)
+    def test_amp(self, color_img, model):
+        img = color_img[..., :64, :64]
+        seq = geo.translation_sequence(img, 5)
+        moog = geo.Geodesic(seq[:1], seq[-1:], model, 5, use_amp=True)
+        # model is shared across tests, so make sure to remove the hook
+        model_dtypes = []
+        hook = model.conv.register_forward_hook(lambda mdl, inp, out: model_dtypes.append(out.dtype))
+        try:
+            amp_loss = moog.objective_function()
+        finally:
+            hook.remove()
+        assert model_dtypes == [torch.bfloat16], "Model should run in amp_dtype!"
+        full_loss = geo.Geodesic(seq[:1], seq[-1:], model, 5).objective_function()
+        assert torch.allclose(amp_loss, full_loss, rtol=5e-2), "AMP loss should be close to full precision loss!"
+        moog.synthesize(max_iter=5)
+        assert moog.geodesic.dtype == img.dtype, "Geodesic should keep the input dtype!"
+
+    @pytest.mark.parametrize('model', ['ColorModel'], indirect=True)
+    def test_amp_save_load(self, color_img, model, tmp_path):
+        # use_amp isn't saved, so we can save with it and load without it
+        img = color_img[..., :64, :64]
+        seq = geo.translation_sequence(img, 5)
+        moog = geo.Geodesic(seq[:1], seq[-1:], model, 5, use_amp=True)
+        moog.synthesize(max_iter=5)
+        moog.save(op.join(tmp_path, 'test_geodesic_amp_save_load.pt'))
+        moog_copy = geo.Geodesic(seq[:1], seq[-1:], model, 5)
+        moog_copy.load(op.join(tmp_path, 'test_geodesic_amp_save_load.pt'))
+        assert not moog_copy._use_amp, "Loading should not change use_amp!"
+        assert torch.equal(moog.geodesic, moog_copy.geodesic), "Geodesic should be loaded!"
+
     @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
     @pytest.mark.parametrize("func", ['objective_function', 'calculate_jerkiness'])
     def test_funcs_external_tensor(self, einstein_small_seq, model, func):
@@ -257,6 +304,17 @@ class TestGeodesic(object):
             with_arg = getattr(moog, func)(arg_tensor)
             assert not torch.equal(no_arg, with_arg), f"{func} is not using the input tensor!"
 
+    @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
+    def test_objective_function_default(self, einstein_small_seq, model):
+        # the loss used during synthesis must be the loss of the full geodesic
+        moog = geo.Geodesic(einstein_small_seq[:1], einstein_small_seq[-1:],
+                            model, 5)
+        moog.synthesize(max_iter=3)
+        default = moog.objective_function()
+        explicit = moog.objective_function(moog.geodesic)
+        assert torch.allclose(default, explicit), "objective_function() differs from objective_function(geodesic)!"
+
+    @pytest.mark.slow
     @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
     def test_continue(self, einstein_small_seq, model):
         moog = geo.Geodesic(einstein_small_seq[:1], einstein_small_seq[-1:],
@@ -274,6 +332,7 @@ class TestGeodesic(object):
         with pytest.raises(ValueError, match='Found a NaN in loss during optimization'):
             moog.synthesize(max_iter=1)
 
+    @pytest.mark.slow
     @pytest.mark.parametrize('model', ['frontend.OnOff.nograd'], indirect=True)
     @pytest.mark.parametrize('store_progress', [True, 2, 3])
     def test_store_progress(self, einstein_small_seq, model, store_progress):
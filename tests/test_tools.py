@@ -4,19 +4,25 @@ import torch
 import numpy as np
 import geodesics as geo
 
+
+@pytest.fixture(scope='module')
+def unwrap_reference():
+    # discontinuity is at +/- pi, so test around that. probably not the
+    # most efficient way to generate angles, but ah well
+    start_angle = torch.tensor([np.pi+np.pi/4])
+    start = torch.cat([torch.cos(start_angle), torch.sin(start_angle)]).reshape((1,1,1,2))
+    angle = torch.tensor([np.pi-np.pi/4])
+    stop = torch.cat([torch.cos(angle), torch.sin(angle)]).reshape((1,1,1,2))
+    line = geo.make_straight_line(start, stop, 10)
+    angles = torch.atan2(line[...,1], line[...,0]).squeeze()
+    return angles, np.unwrap(angles)
+
+
 class TestUnwrap(object):
 
     @pytest.mark.parametrize('ndim', [1,2,3,4,5])
-    def test_unwrap(self, ndim):
-        # discontinuity is at +/- pi, so test around that. probably not the
-        # most efficient way to generate angles, but ah well
-        start_angle = torch.tensor([np.pi+np.pi/4])
-        start = torch.cat([torch.cos(start_angle), torch.sin(start_angle)]).reshape((1,1,1,2))
-        angle = torch.tensor([np.pi-np.pi/4])
-        stop = torch.cat([torch.cos(angle), torch.sin(angle)]).reshape((1,1,1,2))
-        line = geo.make_straight_line(start, stop, 10)
-        angles = torch.atan2(line[...,1], line[...,0]).squeeze()
-        target_angles = np.unwrap(angles)
+    def test_unwrap(self, ndim, unwrap_reference):
+        angles, target_angles = unwrap_reference
         while angles.ndim < ndim:
             angles = angles.unsqueeze(0)
         for target_dim in list(range(ndim)) + list(range(-ndim, 0)):
@@ -25,6 +31,32 @@ class TestUnwrap(object):
             angles = angles.view(*target_shape)
             if not np.allclose(geo.unwrap(angles, target_dim).squeeze(), target_angles):
                 raise ValueError(f"Unwrap failed for ndim: {ndim} and target_dim: {target_dim}")
-        for fail_dim in list(range(ndim, 2*ndim)) + list(range(-2*ndim, -ndim)):
+        if ndim > 1:
+            # angles currently has size 11 along its last dim, so the first
+            # dim is a singleton, along which there is nothing to unwrap
+            assert torch.equal(geo.unwrap(angles, 0), angles), "Unwrap changed tensor along singleton dim!"
+        # the check is a single range comparison, so only need to test the
+        # first invalid dim on either side
+        for fail_dim in [ndim, -ndim-1]:
             with pytest.raises(ValueError, match="dim must lie within"):
                 geo.unwrap(angles, fail_dim)
+
+    def test_unwrap_long(self):
+        # corrections accumulate along dim, so over a long float32 sequence,
+        # accumulating them in floating point drifts away from the float64
+        # reference (by more than this tolerance), whereas counting whole
+        # periods doesn't
+        rng = np.random.default_rng(0)
+        walk = np.cumsum(rng.uniform(-3, 3, size=100000))
+        angles = np.angle(np.exp(1j * walk)).astype(np.float32)
+        target_angles = np.unwrap(angles.astype(np.float64))
+        unwrapped = geo.unwrap(torch.from_numpy(angles))
+        assert np.allclose(unwrapped, target_angles, rtol=1e-6, atol=1e-5), "Unwrap drifted on long sequence!"
+
+    @pytest.mark.parametrize('bad_value', [np.nan, np.inf])
+    def test_unwrap_nonfinite(self, bad_value, unwrap_reference):
+        angles, _ = unwrap_reference
+        angles = angles.clone()
+        angles[5] = bad_value
+        unwrapped = geo.unwrap(angles)
+        assert np.allclose(unwrapped, np.unwrap(angles), equal_nan=True), "Unwrap failed with non-finite value!"